@@ -2,6 +2,7 @@
 # from flask import Flask
 import os
 from views import app
+from models import username_index
 # from .models import User
 
 # app = Flask(__name__)
@@ -10,4 +11,6 @@ if __name__ == '__main__':
     if os.environ.get('BS_DEBUG'):
         app.debug = True
         print("Hit debug block.")
+    username_index.start(interval=int(os.environ.get('BS_INDEX_REFRESH',
+                                                     300)))
     app.run()
@@ -1,9 +1,12 @@
 """This module contains models for bulldozer_severe."""
+from array import array
+from bisect import bisect_left, insort
 from datetime import datetime
 from py2neo import Graph, Node, Relationship, authenticate
 from passlib.hash import bcrypt
 from uuid import uuid4
 import os
+import threading
 
 
 DATABASE_URL = os.environ.get('NEO4JDB')
@@ -18,6 +21,167 @@ if username and password:
 graph = Graph('{}/db/data/'.format(url))  # py2neo will raise 'Unauthorized'
 
 
+class UsernameIndex(object):
+    """Keep a sorted, in-memory list of usernames for prefix search."""
+
+    def __init__(self):
+        """Start with an empty index; fill it with start() or rebuild()."""
+        self.usernames = []
+        self.added = set()
+        self.lock = threading.Lock()
+        self.rebuild_lock = threading.Lock()
+
+    def start(self, interval=None):
+        """Build the index now.
+
+        Given an interval in seconds, keep rebuilding it in the background
+        so users registered by other processes show up."""
+        self.rebuild()
+        if interval:
+            timer = threading.Timer(interval, self.start, [interval])
+            timer.daemon = True
+            timer.start()
+
+    def rebuild(self):
+        """Replace the index with every username currently in the graph."""
+        with self.rebuild_lock:
+            with self.lock:
+                self.added = set()
+            # read without the lock so searches are not blocked by the scan
+            cursor = graph.run("MATCH (u:User) RETURN u.username AS username")
+            usernames = set(record['username'] for record in cursor)
+            with self.lock:
+                # keep names add()ed while the scan was running
+                self.usernames = sorted(usernames | self.added)
+
+    def add(self, username):
+        """Insert a single username, keeping the list sorted."""
+        with self.lock:
+            i = bisect_left(self.usernames, username)
+            if i == len(self.usernames) or self.usernames[i] != username:
+                insort(self.usernames, username, i)
+            self.added.add(username)
+
+    def discard(self, username):
+        """Remove a username from the index if it is present."""
+        with self.lock:
+            i = bisect_left(self.usernames, username)
+            if i < len(self.usernames) and self.usernames[i] == username:
+                del self.usernames[i]
+            self.added.discard(username)
+
+    def search(self, prefix, limit=10, exclude=()):
+        """Return up to limit usernames starting with prefix.
+
+        Usernames in exclude are skipped."""
+        matches = []
+        if not prefix:
+            return matches
+        exclude = set(exclude)
+        with self.lock:
+            i = bisect_left(self.usernames, prefix)
+            while i < len(self.usernames) and len(matches) < limit:
+                name = self.usernames[i]
+                if not name.startswith(prefix):
+                    break
+                if name not in exclude:
+                    matches.append(name)
+                i += 1
+        return matches
+
+
+username_index = UsernameIndex()
+
+
+def _compress(pairs, size):
+    """Pack (row, column) pairs into offset and column arrays by row."""
+    offsets = array('i', [0]) * (size + 1)
+    for row, _ in pairs:
+        offsets[row + 1] += 1
+    for i in range(size):
+        offsets[i + 1] += offsets[i]
+    columns = array('i', [0]) * len(pairs)
+    cursor = array('i', offsets[:size])
+    for row, column in pairs:
+        columns[cursor[row]] = column
+        cursor[row] += 1
+    return offsets, columns
+
+
+def suggest_groups(memberships, limit=5):
+    """Return a dict of username to suggested group ids.
+
+    memberships is an iterable of (username, group id) pairs.  Groups are
+    ranked by how many of a user's group-mates are in them, leaving out
+    groups the user is already in."""
+    users = {}
+    groups = {}
+    pairs = set()
+    for username, group_id in memberships:
+        u = users.setdefault(username, len(users))
+        g = groups.setdefault(group_id, len(groups))
+        pairs.add((u, g))
+    group_ids = sorted(groups, key=groups.get)
+    user_ptr, user_groups = _compress(sorted(pairs), len(users))
+    group_ptr, group_users = _compress(sorted((g, u) for u, g in pairs),
+                                       len(groups))
+
+    counts = array('i', [0]) * len(groups)
+    # count each group-mate once, however many groups they share with u
+    seen = array('i', [0]) * len(users)
+    suggestions = {}
+    for username, u in users.items():
+        own = user_groups[user_ptr[u]:user_ptr[u + 1]]
+        touched = []
+        mates = []
+        for g in own:
+            for v in group_users[group_ptr[g]:group_ptr[g + 1]]:
+                if v == u or seen[v]:
+                    continue
+                seen[v] = 1
+                mates.append(v)
+                for h in user_groups[user_ptr[v]:user_ptr[v + 1]]:
+                    if not counts[h]:
+                        touched.append(h)
+                    counts[h] += 1
+        for g in own:
+            counts[g] = 0
+        ranked = sorted((h for h in touched if counts[h]),
+                        key=lambda h: (-counts[h], group_ids[h]))
+        suggestions[username] = [group_ids[h] for h in ranked[:limit]]
+        for h in touched:
+            counts[h] = 0
+        for v in mates:
+            seen[v] = 0
+    return suggestions
+
+
+def refresh_group_suggestions(limit=5, label=None):
+    """Recompute group suggestions and store them on each User node.
+
+    Given a label, only User nodes that also carry it are read and
+    written."""
+    user_labels = 'User:{}'.format(label) if label else 'User'
+    cursor = graph.run("MATCH (u:{})-[:in]->(g:Usergroup) "
+                       "RETURN u.username AS username, g.id AS group_id, "
+                       "g.groupname AS groupname".format(user_labels))
+    memberships = []
+    groupnames = {}
+    for record in cursor:
+        memberships.append((record['username'], record['group_id']))
+        groupnames[record['group_id']] = record['groupname']
+    rows = [{'username': name,
+             'ids': ids,
+             'groupnames': [groupnames[group_id] for group_id in ids]}
+            for name, ids in suggest_groups(memberships, limit).items()]
+    graph.run("UNWIND {rows} AS row "
+              "MATCH (u:" + user_labels + " {username: row.username}) "
+              "SET u.suggested_group_ids = row.ids, "
+              "u.suggested_groupnames = row.groupnames",
+              rows=rows)
+    return len(rows)
+
+
 class User(object):
     """Define user object and related methods."""
 
@@ -43,6 +207,7 @@ class User(object):
                              xp=0,
                              gold=0,)
             graph.create(user_node)
+            username_index.add(self.username)
         return self
 
     def get_by_id(self):
@@ -68,6 +233,20 @@ class User(object):
                 grouplist.append(Usergroup(id=rel.end_node()['id']))
         return grouplist
 
+    def get_suggested_groups(self, exclude=()):
+        """Return precomputed (id, groupname) pairs of suggested groups.
+
+        Group ids in exclude, such as groups joined since the suggestions
+        were computed, are left out."""
+        user_node = self.get()
+        if not user_node:
+            return []
+        exclude = set(exclude)
+        return [(group_id, groupname) for group_id, groupname in
+                zip(user_node['suggested_group_ids'] or [],
+                    user_node['suggested_groupnames'] or [])
+                if group_id not in exclude]
+
 
 class Usergroup(object):
     """Define a usergroup model."""
@@ -111,6 +290,25 @@ class Usergroup(object):
                                         property_value=id)
         return usergroup_node
 
+    @classmethod
+    def roster(cls, id):
+        """Return (owners, members) username sets for a group id.
+
+        Returns None if there is no such group."""
+        cursor = graph.run("MATCH (g:Usergroup {id: {id}}) "
+                           "OPTIONAL MATCH (u:User)-[r:owns|in]->(g) "
+                           "RETURN u.username AS username, type(r) AS rel",
+                           id=id)
+        roster = None
+        for record in cursor:
+            if roster is None:
+                roster = (set(), set())
+            if record['rel'] == 'owns':
+                roster[0].add(record['username'])
+            elif record['rel'] == 'in':
+                roster[1].add(record['username'])
+        return roster
+
     def get(self):
         """Return a usergroup node for given id."""
         usergroup_node = graph.find_one("Usergroup",
@@ -0,0 +1,9 @@
+"""Precompute group suggestions for every user.
+
+~$ python suggest_groups.py
+
+"""
+from models import refresh_group_suggestions
+
+if __name__ == '__main__':
+    print("Stored suggestions for {} users.".format(refresh_group_suggestions()))
@@ -1,8 +1,8 @@
 """Define Views."""
-from flask import Flask, request, session, redirect, url_for, render_template, flash
+from flask import Flask, request, session, redirect, url_for, render_template, flash, jsonify
 # from flask.ext.principal import AnonymousIdentity, Identity, identity_changed, Permission, Principal, RoleNeed
 import os
-from models import User, Usergroup
+from models import User, Usergroup, username_index
 from security import user_match
 
 app = Flask(__name__)
@@ -106,8 +106,11 @@ def profile(username):
     else:
         user = User(username) if username else User(session['username'])
         group_list = user.get_groups()
+        suggested_groups = user.get_suggested_groups(
+            exclude=[group.id for group in group_list])
         return render_template('profile.html',
                                group_list=group_list,
+                               suggested_groups=suggested_groups,
                                user=user)
 
 
@@ -138,6 +141,23 @@ def usergroup_add_member(id):
     return redirect(url_for('usergroup_profile', id=id))
 
 
+@app.route('/profile/usergroup/search_members/<id>', methods=['GET'])
+def usergroup_search_members(id):
+    """Return usernames matching a prefix who are not yet in the group.
+
+    Only owners of the group, who are the ones able to add members, get
+    results."""
+    if not session.get('logged_in'):
+        return jsonify(usernames=[])
+    roster = Usergroup.roster(id)
+    if not roster or session.get('username') not in roster[0]:
+        return jsonify(usernames=[])
+    owners, members = roster
+    prefix = request.args.get('q', '')
+    usernames = username_index.search(prefix, exclude=members)
+    return jsonify(usernames=usernames)
+
+
 @app.route('/logout', methods=['GET'])
 def logout():
     """Manage logout route."""
@@ -5,6 +5,8 @@
 """
 
 from bs.models import graph, url, password, Quest, User, Usergroup, username
+from bs.models import UsernameIndex, username_index, suggest_groups
+from bs.models import refresh_group_suggestions
 from py2neo import Graph, Relationship, authenticate, Node
 import unittest
 
@@ -16,6 +18,7 @@ class TestModelMethods(unittest.TestCase):
 
     def setUp(self):
         self.graph = graph
+        self.indexed_usernames = list(username_index.usernames)
 
         self.user1 = User('testdoug')
         self.user2 = User('testbob')
@@ -47,6 +50,7 @@ class TestModelMethods(unittest.TestCase):
     def tearDown(self):
         """Delete all 'test' nodes."""
         self.graph.run("MATCH (n:Test) DETACH DELETE n")
+        username_index.usernames = self.indexed_usernames
 
     def test_new_user(self):
         """Add a new user and check that the graph is updated."""
@@ -66,6 +70,18 @@ class TestModelMethods(unittest.TestCase):
         check_list = [member.username for member in self.usergroup1.find_users_by_rel('in')]
         self.assertIn(self.user2.username, check_list)
 
+    def test_roster_updates_after_add_member(self):
+        """Roster reflects a member added after an earlier lookup."""
+        owners, members = Usergroup.roster(self.usergroup1.id)
+        self.assertIn(self.user1.username, owners)
+        self.assertNotIn(self.user2.username, members)
+        self.usergroup1.add_member(self.user2)
+        owners, members = Usergroup.roster(self.usergroup1.id)
+        self.assertIn(self.user2.username, members)
+
+    def test_roster_missing_group(self):
+        self.assertIsNone(Usergroup.roster('no-such-group'))
+
     def test_add_owner_to_group(self):
         """Add user2 to usergroup1 and check that membership is updated."""
         self.usergroup1.add_owner(self.user2)
@@ -123,6 +139,117 @@ class TestModelMethods(unittest.TestCase):
 
         # self.assertRaises(ValueError, self.quest1.complete, self.user2)
 
+    def make_second_group(self):
+        """Register testgroup2 owned by user2 and put user2 in usergroup1."""
+        self.usergroup1.add_member(self.user2)
+        usergroup2 = Usergroup(groupname='testgroup2',
+                               session={'username': self.user2.username})
+        usergroup2.register(self.user2)
+        node = usergroup2.get()
+        node.add_label('Test')
+        self.graph.push(node)
+        return usergroup2
+
+    def test_refresh_group_suggestions(self):
+        """Suggestions are stored on User nodes and read back."""
+        usergroup2 = self.make_second_group()
+        refresh_group_suggestions(label='Test')
+        self.assertEqual(self.user1.get_suggested_groups(),
+                         [(usergroup2.id, 'testgroup2')])
+        self.assertEqual(self.user2.get_suggested_groups(), [])
+
+    def test_no_stored_suggestions(self):
+        self.user3 = User('testjim')
+        self.user3.register('jimspw')
+        user3_node = self.user3.get()
+        user3_node.add_label('Test')
+        self.graph.push(user3_node)
+        self.assertEqual(self.user3.get_suggested_groups(), [])
+
+    def test_joined_group_not_suggested(self):
+        """A group joined after the batch run is left out."""
+        usergroup2 = self.make_second_group()
+        refresh_group_suggestions(label='Test')
+        usergroup2.add_member(self.user1)
+        joined = [group.id for group in self.user1.get_groups()]
+        self.assertNotIn((usergroup2.id, 'testgroup2'),
+                         self.user1.get_suggested_groups(exclude=joined))
+
+    def test_rebuild_username_index(self):
+        index = UsernameIndex()
+        index.rebuild()
+        self.assertIn(self.user1.username, index.usernames)
+        self.assertIn(self.user2.username, index.usernames)
+
+    def test_register_updates_username_index(self):
+        self.assertIn(self.user1.username, username_index.usernames)
+        self.user3 = User('testjim')
+        self.user3.register('jimspw')
+        user3_node = self.user3.get()
+        user3_node.add_label('Test')
+        self.graph.push(user3_node)
+        self.assertIn(self.user3.username,
+                      username_index.search('testj', exclude=['testdoug']))
+
+
+class TestUsernameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = UsernameIndex()
+        for name in ['testdoug', 'testbob', 'testbill', 'alice', 'testbob']:
+            self.index.add(name)
+
+    def test_add_keeps_sorted_and_unique(self):
+        self.assertEqual(self.index.usernames,
+                         ['alice', 'testbill', 'testbob', 'testdoug'])
+
+    def test_search_prefix(self):
+        self.assertEqual(self.index.search('testb'), ['testbill', 'testbob'])
+        self.assertEqual(self.index.search('nobody'), [])
+        self.assertEqual(self.index.search(''), [])
+
+    def test_discard(self):
+        self.index.discard('testbob')
+        self.index.discard('nobody')
+        self.assertEqual(self.index.usernames,
+                         ['alice', 'testbill', 'testdoug'])
+
+    def test_search_limit_and_exclude(self):
+        self.assertEqual(self.index.search('test', limit=2),
+                         ['testbill', 'testbob'])
+        self.assertEqual(self.index.search('test', limit=2,
+                                           exclude=['testbill']),
+                         ['testbob', 'testdoug'])
+
+
+class TestSuggestGroups(unittest.TestCase):
+
+    def setUp(self):
+        self.memberships = [('doug', 'a'), ('doug', 'b'),
+                            ('bob', 'a'), ('bob', 'c'), ('bob', 'd'),
+                            ('bill', 'b'), ('bill', 'c'),
+                            ('jim', 'e')]
+
+    def test_ranks_by_co_membership(self):
+        suggestions = suggest_groups(self.memberships)
+        self.assertEqual(suggestions['doug'], ['c', 'd'])
+        self.assertEqual(suggestions['bill'], ['a', 'd'])
+
+    def test_excludes_own_groups_and_loners(self):
+        suggestions = suggest_groups(self.memberships)
+        self.assertNotIn('a', suggestions['bob'])
+        self.assertEqual(suggestions['jim'], [])
+
+    def test_group_mate_counted_once(self):
+        """A group-mate sharing several groups adds one to each of theirs."""
+        memberships = [('u', 'a'), ('u', 'b'),
+                       ('v', 'a'), ('v', 'b'), ('v', 'z'),
+                       ('w', 'a'), ('w', 'y')]
+        self.assertEqual(suggest_groups(memberships)['u'], ['y', 'z'])
+
+    def test_limit(self):
+        self.assertEqual(suggest_groups(self.memberships, limit=1)['doug'],
+                         ['c'])
 
 
 if __name__ == '__main__':